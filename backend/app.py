@@ -10,10 +10,14 @@
 # ==============================================================================
 
 import sqlite3
+import threading
+import functools
+from collections import OrderedDict
 import pandas as pd
 from datetime import timedelta
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
 from dotenv import load_dotenv
@@ -32,7 +36,8 @@ from langchain.agents.agent_types import AgentType
 app = FastAPI(
     title="AI Dispute Assistant API",
     description="API for managing and analyzing payment disputes.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS to allow requests from your Next.js frontend
@@ -50,12 +55,52 @@ app.add_middleware(
 
 DB_PATH = 'database.db'
 
-def get_db_connection():
+# WAL lets readers run alongside a writer, and NORMAL sync is safe under WAL while
+# halving the fsyncs per commit. The cache (64 MB) and mmap (256 MB) sizes keep hot pages in memory.
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+PRAGMA mmap_size=268435456;
+"""
+
+def get_db_connection(isolation_level=""):
     """Creates a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=isolation_level)
+    conn.executescript(SQLITE_PRAGMAS)
     conn.row_factory = sqlite3.Row
     return conn
 
+# Long-lived connections shared by all requests so the page cache stays warm between calls.
+# Reads run in autocommit mode; writes go through a dedicated connection, one at a time.
+READ_CONN = get_db_connection(isolation_level=None)
+READ_LOCK = threading.Lock()
+WRITE_CONN = get_db_connection()
+WRITE_LOCK = threading.Lock()
+
+# Indexes backing the endpoints' lookups and sort orders. setup_db.py creates these itself
+# (TABLE_INDEXES); they are also created at startup to cover databases built by older versions
+# of the setup scripts, which have none. IF NOT EXISTS makes this a no-op otherwise.
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_disputes_created ON disputes (created_at DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_disputes_cat ON disputes (predicted_category)',
+    'CREATE INDEX IF NOT EXISTS idx_history_d_t ON dispute_history (dispute_id, "timestamp")',
+    'CREATE INDEX IF NOT EXISTS idx_txn_dup ON transactions (customer_id, merchant, amount, "timestamp")',
+]
+
+@app.on_event("startup")
+def create_indexes():
+    """Creates the indexes used by the API for every table that is present."""
+    conn = get_db_connection()
+    for statement in INDEXES:
+        try:
+            conn.execute(statement)
+        except sqlite3.OperationalError as e:
+            print(f"Warning: Could not create index: {e}")
+    conn.commit()
+    conn.close()
+
 # --- [2. PYDANTIC MODELS FOR DATA VALIDATION] ---
 
 # This model defines the structure for the status update request body
@@ -68,14 +113,19 @@ class ChatQuery(BaseModel):
 
 # --- [3. CORE API ENDPOINTS] ---
 
+# Columns shown in the disputes table. The long free-text fields (description, explanation,
+# justification) are only needed on the detail page, which fetches them separately.
+DISPUTE_LIST_COLUMNS = ("dispute_id", "customer_id", "txn_id", "predicted_category", "confidence",
+                        "suggested_action", "status", "created_at")
+DISPUTE_LIST_QUERY = f"SELECT {', '.join(DISPUTE_LIST_COLUMNS)} FROM disputes ORDER BY created_at DESC"
+
 @app.get("/api/disputes", response_model=List[Dict[str, Any]])
 def get_disputes():
     """Fetch all disputes from the database, ordered by creation date."""
     try:
-        conn = get_db_connection()
-        disputes = conn.execute('SELECT * FROM disputes ORDER BY created_at DESC').fetchall()
-        conn.close()
-        return [dict(row) for row in disputes]
+        with READ_LOCK:
+            disputes = READ_CONN.execute(DISPUTE_LIST_QUERY).fetchall()
+        return [dict(zip(DISPUTE_LIST_COLUMNS, row)) for row in disputes]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -83,13 +133,17 @@ def get_disputes():
 def get_dispute_details(dispute_id: str):
     """Fetch details for a single dispute and its complete history."""
     try:
-        conn = get_db_connection()
-        dispute = conn.execute('SELECT * FROM disputes WHERE dispute_id = ?', (dispute_id,)).fetchone()
-        history = conn.execute('SELECT * FROM dispute_history WHERE dispute_id = ? ORDER BY timestamp ASC', (dispute_id,)).fetchall()
-        conn.close()
-
-        if dispute is None:
-            raise HTTPException(status_code=404, detail="Dispute not found")
+        # Both reads share one read transaction (a single WAL snapshot), and the history
+        # lookup is skipped entirely when the dispute doesn't exist.
+        with READ_LOCK:
+            READ_CONN.execute('BEGIN')
+            try:
+                dispute = READ_CONN.execute('SELECT * FROM disputes WHERE dispute_id = ?', (dispute_id,)).fetchone()
+                if dispute is None:
+                    raise HTTPException(status_code=404, detail="Dispute not found")
+                history = READ_CONN.execute('SELECT * FROM dispute_history WHERE dispute_id = ? ORDER BY timestamp ASC', (dispute_id,)).fetchall()
+            finally:
+                READ_CONN.execute('COMMIT')
         
         return {
             "details": dict(dispute),
@@ -105,23 +159,21 @@ def get_dispute_details(dispute_id: str):
 def update_dispute_status(dispute_id: str, status_update: StatusUpdate):
     """Update the status of a dispute and log the change in the history table."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        current_dispute = cursor.execute('SELECT status FROM disputes WHERE dispute_id = ?', (dispute_id,)).fetchone()
-        if current_dispute is None:
-            raise HTTPException(status_code=404, detail="Dispute not found")
-        
-        old_status = current_dispute['status']
         new_status = status_update.status
-        
-        cursor.execute('UPDATE disputes SET status = ? WHERE dispute_id = ?', (new_status, dispute_id))
-        cursor.execute('INSERT INTO dispute_history (dispute_id, field_changed, old_value, new_value) VALUES (?, ?, ?, ?)',
-                       (dispute_id, 'status', old_status, new_status))
-        
-        conn.commit()
-        conn.close()
-        
+        # The connection context manager commits on success and rolls back on any error.
+        with WRITE_LOCK, WRITE_CONN:
+            # Log the change first, reading the old status straight from the row being updated;
+            # no row inserted means the dispute doesn't exist.
+            cursor = WRITE_CONN.execute(
+                "INSERT INTO dispute_history (dispute_id, field_changed, old_value, new_value) "
+                "SELECT dispute_id, 'status', status, ? FROM disputes WHERE dispute_id = ?",
+                (new_status, dispute_id))
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Dispute not found")
+
+            WRITE_CONN.execute('UPDATE disputes SET status = ? WHERE dispute_id = ?', (new_status, dispute_id))
+
+        _apply_status_update(dispute_id, new_status)
         return {"success": True, "message": f"Dispute {dispute_id} status updated to {new_status}"}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -134,45 +186,57 @@ def update_dispute_status(dispute_id: str, status_update: StatusUpdate):
 def get_trends():
     """Get aggregated data for dispute trends visualization."""
     try:
-        conn = get_db_connection()
         query = "SELECT date(created_at) as day, predicted_category, COUNT(*) as count FROM disputes GROUP BY day, predicted_category ORDER BY day;"
-        trends_df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        pivot_df = trends_df.pivot(index='day', columns='predicted_category', values='count').fillna(0)
-        chart_data = pivot_df.reset_index().to_dict(orient='records')
-        
+        with READ_LOCK:
+            rows = READ_CONN.execute(query).fetchall()
+
+        # SQL has already aggregated, so reshaping to one record per day is a single pass.
+        counts_by_day = {}
+        categories = set()
+        for day, category, count in rows:
+            counts_by_day.setdefault(day, {})[category] = count
+            categories.add(category)
+
+        chart_data = [
+            {"day": day, **{category: counts.get(category, 0) for category in sorted(categories)}}
+            for day, counts in counts_by_day.items()
+        ]
         return chart_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Pairs each transaction with the previous one for the same customer, merchant and amount
+# (ordered by time) and keeps the pairs that are at most 5 minutes apart. The window is
+# served from idx_txn_dup, so SQLite never has to sort the table.
+FUZZY_DUPLICATES_QUERY = """
+WITH ordered AS (
+    SELECT txn_id, customer_id, amount, merchant,
+           LAG(txn_id) OVER w AS prev_txn_id,
+           strftime('%s', "timestamp") - strftime('%s', LAG("timestamp") OVER w) AS time_diff
+    FROM transactions
+    WINDOW w AS (PARTITION BY customer_id, merchant, amount ORDER BY "timestamp")
+)
+SELECT prev_txn_id AS original_txn_id, txn_id AS duplicate_txn_id, customer_id, amount, merchant,
+       CAST(time_diff AS REAL) AS time_diff_seconds
+FROM ordered
+WHERE prev_txn_id IS NOT NULL AND time_diff <= ?
+"""
+
+# The transactions table is effectively append-only, so its row count and highest rowid
+# are enough to tell whether the last scan is still valid.
+_dup_cache = {"key": None, "value": None}
+
 @app.get("/api/find-fuzzy-duplicates")
 def find_fuzzy_duplicates():
     """Runs the fuzzy matching logic on the transactions table."""
     try:
-        conn = get_db_connection()
-        transactions_df = pd.read_sql_query("SELECT * FROM transactions", conn)
-        conn.close()
-
-        transactions_df['timestamp'] = pd.to_datetime(transactions_df['timestamp'])
-        transactions_df = transactions_df.sort_values(by=['customer_id', 'timestamp'])
-        
-        potential_duplicates = []
-        for _, group in transactions_df.groupby('customer_id'):
-            for i, row1 in group.iterrows():
-                for _, row2 in group.loc[i+1:].iterrows():
-                    time_diff = row2['timestamp'] - row1['timestamp']
-                    if (row1['amount'] == row2['amount'] and
-                        row1['merchant'] == row2['merchant'] and
-                        time_diff <= timedelta(minutes=5)):
-                        
-                        potential_duplicates.append({
-                            'original_txn_id': row1['txn_id'], 'duplicate_txn_id': row2['txn_id'],
-                            'customer_id': row1['customer_id'], 'amount': row1['amount'],
-                            'merchant': row1['merchant'], 'time_diff_seconds': time_diff.total_seconds()
-                        })
-                        break
-        
+        with READ_LOCK:
+            key = tuple(READ_CONN.execute("SELECT COUNT(*), MAX(rowid) FROM transactions").fetchone())
+            if key == _dup_cache["key"]:
+                return _dup_cache["value"]
+            duplicates = READ_CONN.execute(FUZZY_DUPLICATES_QUERY, (timedelta(minutes=5).total_seconds(),)).fetchall()
+        potential_duplicates = [dict(row) for row in duplicates]
+        _dup_cache["key"], _dup_cache["value"] = key, potential_duplicates
         return potential_duplicates
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -182,64 +246,111 @@ def find_fuzzy_duplicates():
 # This is a helper function to avoid loading data on every single request
 # In a production app, you'd use a more robust caching mechanism
 _cached_data = None
+# Bumped whenever _cached_data changes, so anything built from the data can tell it is stale.
+_df_version = 0
 def get_agent_dataframes():
     """Loads and prepares the SINGLE disputes dataframe for the agent, caching it in memory."""
-    global _cached_data
+    global _cached_data, _df_version
     if _cached_data is None:
         print("Loading and caching data for agent...")
         # *** CHANGE #1: ONLY LOAD THE 'disputes' TABLE ***
-        disputes_df = pd.read_sql_query("SELECT * FROM disputes", get_db_connection())
-        disputes_df['created_at'] = pd.to_datetime(disputes_df['created_at'])
+        # Arrow-backed columns keep the text fields far smaller than object dtype,
+        # and created_at is parsed while reading instead of in a second pass.
+        with READ_LOCK:
+            disputes_df = pd.read_sql_query("SELECT * FROM disputes", READ_CONN,
+                                            parse_dates=["created_at"], dtype_backend="pyarrow")
         # The agent now receives a list with just ONE dataframe
         _cached_data = [disputes_df]
+        _df_version += 1
     return _cached_data
 
+def _apply_status_update(dispute_id, new_status):
+    """Mirrors a status change into the cached agent dataframe instead of reloading the table."""
+    global _df_version
+    if _cached_data is None:
+        return
+    disputes_df = _cached_data[0]
+    disputes_df.loc[disputes_df['dispute_id'] == dispute_id, 'status'] = new_status
+    _df_version += 1
+
+@app.on_event("startup")
+def warm_agent_dataframes():
+    """Loads the agent dataframe at startup so the first chat request doesn't pay for it."""
+    try:
+        get_agent_dataframes()
+    except Exception as e:
+        print(f"Warning: Could not preload agent data: {e}")
+
+# *** CHANGE #2: UPDATE THE AGENT'S INSTRUCTIONS ***
+AGENT_PREFIX = """
+You are a direct and factual AI assistant for analyzing financial dispute data.
+Your ONLY goal is to answer questions by executing Python code on a pandas dataframe named `df1`.
+
+**IMPORTANT RULES:**
+1.  **DO NOT** greet the user or engage in conversational chit-chat.
+2.  **DO NOT** redefine the dataframe `df1`. It is already provided to you.
+3.  Your task is to translate the user's question directly into executable pandas code using `df1`.
+4.  If the user's query is a greeting or does not seem like a question about the data (e.g., "hi", "how are you"), your ONLY valid response is: "I can only answer questions about the dispute data. Please ask a question like 'How many fraud cases are there?'"
+
+**DATA CONTEXT:**
+- `df1` contains all dispute data. Key columns are 'predicted_category', 'status', 'suggested_action', and 'created_at'.
+- **The `status` column can have values like 'OPEN', 'IN_REVIEW', 'RESOLVED', 'CLOSED'. "Unresolved" means the status is not 'RESOLVED' or 'CLOSED'.**
+- A query about "duplicates" means you must filter `df1['predicted_category'] == 'DUPLICATE_CHARGE'`.
+- A query about "fraud" means you must filter `df1['predicted_category'] == 'FRAUD'`.
+
+**--- FINAL ANSWER FORMATTING ---**
+Your final answer MUST be a clear, human-readable sentence or a summarized list.
+**DO NOT** output the python code or the raw dataframe as your final answer.
+For example, after calculating a count, DO NOT answer `df1[df1['predicted_category'] == 'FRAUD'].shape[0]`.
+Instead, your final answer should be: "There are 3 fraud cases."
+"""
+
+@functools.lru_cache(maxsize=1)
+def _get_llm():
+    """Creates the OpenAI LLM once; it is only needed when the first chat request arrives."""
+    return OpenAI(temperature=0)
+
+@functools.lru_cache(maxsize=1)
+def _get_agent(df_version: int):
+    """Builds the pandas agent for a given data version and keeps it until the data changes."""
+    return create_pandas_dataframe_agent(
+        llm=_get_llm(),
+        df=get_agent_dataframes(), # This now correctly passes a list with one dataframe
+        prefix=AGENT_PREFIX,
+        verbose=True,
+        agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        allow_dangerous_code=True
+    )
+
+# Answers keyed on (normalized query, data version); the least recently used entry is evicted first.
+CHAT_CACHE_SIZE = 512
+_chat_cache = OrderedDict()
+_chat_cache_lock = threading.Lock()
+
 @app.post("/api/chat")
 def handle_chat_query(query: ChatQuery):
     """Receives a user query, runs it through the LangChain agent, and returns the answer."""
-    
-    # *** CHANGE #2: UPDATE THE AGENT'S INSTRUCTIONS ***
-    AGENT_PREFIX = """
-    You are a direct and factual AI assistant for analyzing financial dispute data.
-    Your ONLY goal is to answer questions by executing Python code on a pandas dataframe named `df1`.
-
-    **IMPORTANT RULES:**
-    1.  **DO NOT** greet the user or engage in conversational chit-chat.
-    2.  **DO NOT** redefine the dataframe `df1`. It is already provided to you.
-    3.  Your task is to translate the user's question directly into executable pandas code using `df1`.
-    4.  If the user's query is a greeting or does not seem like a question about the data (e.g., "hi", "how are you"), your ONLY valid response is: "I can only answer questions about the dispute data. Please ask a question like 'How many fraud cases are there?'"
-
-    **DATA CONTEXT:**
-    - `df1` contains all dispute data. Key columns are 'predicted_category', 'status', 'suggested_action', and 'created_at'.
-    - **The `status` column can have values like 'OPEN', 'IN_REVIEW', 'RESOLVED', 'CLOSED'. "Unresolved" means the status is not 'RESOLVED' or 'CLOSED'.**
-    - A query about "duplicates" means you must filter `df1['predicted_category'] == 'DUPLICATE_CHARGE'`.
-    - A query about "fraud" means you must filter `df1['predicted_category'] == 'FRAUD'`.
-
-    **--- FINAL ANSWER FORMATTING ---**
-    Your final answer MUST be a clear, human-readable sentence or a summarized list.
-    **DO NOT** output the python code or the raw dataframe as your final answer.
-    For example, after calculating a count, DO NOT answer `df1[df1['predicted_category'] == 'FRAUD'].shape[0]`.
-    Instead, your final answer should be: "There are 3 fraud cases."
-    """
-    
     try:
-        # Get the cached dataframes
-        dataframes = get_agent_dataframes()
-        
-        # Initialize the agent
-        agent = create_pandas_dataframe_agent(
-            llm=OpenAI(temperature=0),
-            df=dataframes, # This now correctly passes a list with one dataframe
-            prefix=AGENT_PREFIX,
-            verbose=True,
-            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            allow_dangerous_code=True
-        )
+        # Make sure the cached dataframes (and so _df_version) are loaded
+        get_agent_dataframes()
+        cache_key = (query.query.strip().lower(), _df_version)
+        with _chat_cache_lock:
+            if cache_key in _chat_cache:
+                _chat_cache.move_to_end(cache_key)
+                return {"answer": _chat_cache[cache_key]}
+
+        agent = _get_agent(_df_version)
         
         # Invoke the agent with the user's query
         response = agent.invoke(query.query)
+        answer = response.get('output', "I couldn't find an answer.")
+
+        with _chat_cache_lock:
+            _chat_cache[cache_key] = answer
+            if len(_chat_cache) > CHAT_CACHE_SIZE:
+                _chat_cache.popitem(last=False)
         
-        return {"answer": response.get('output', "I couldn't find an answer.")}
+        return {"answer": answer}
         
     except Exception as e:
         print(f"Agent Error: {e}")
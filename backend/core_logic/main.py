@@ -13,10 +13,14 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
+import asyncio
+import functools
+import hashlib
+import sqlite3
+import torch
 from sentence_transformers import SentenceTransformer
 import openai
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
+from tqdm.asyncio import tqdm_asyncio
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -24,9 +28,13 @@ load_dotenv()
 
 # --- [0. CONFIGURATION AND SETUP] ---
 
-# Controls how many LLM API calls to make simultaneously.
+# Controls how many LLM API calls can be in flight at once.
 # Increase for faster processing, but be mindful of API rate limits.
-MAX_WORKERS = 10
+MAX_CONCURRENT_REQUESTS = 32
+
+# Embedding settings. Larger batches amortize per-batch overhead; on a GPU the encoder runs in FP16.
+ENCODE_BATCH_SIZE = 128
+DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
 
 def initialize_openai_client():
     """Initializes the OpenAI client, ensuring the API key is set."""
@@ -38,7 +46,7 @@ def initialize_openai_client():
         print("="*60)
         exit()
     try:
-        client = openai.OpenAI(api_key=api_key)
+        client = openai.AsyncOpenAI(api_key=api_key)
         print("OpenAI client initialized successfully.")
         return client
     except Exception as e:
@@ -49,6 +57,18 @@ def initialize_openai_client():
 client = initialize_openai_client()
 print("-" * 30)
 
+# On-disk cache of LLM responses, so re-runs only pay for descriptions they haven't seen before.
+LLM_CACHE_PATH = 'llm_cache.db'
+
+def open_llm_cache():
+    """Opens (and creates if needed) the SQLite-backed LLM response cache."""
+    conn = sqlite3.connect(LLM_CACHE_PATH)
+    conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, val TEXT)')
+    conn.commit()
+    return conn
+
+llm_cache = open_llm_cache()
+
 # --- [1. LOAD LOCAL ML ASSETS] ---
 
 print("Loading local machine learning assets...")
@@ -57,7 +77,13 @@ try:
         model = pickle.load(f)
     with open('pca.pkl', 'rb') as f:
         pca = pickle.load(f)
-    sentence_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    sentence_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', device=DEVICE)
+    if DEVICE == 'cuda':
+        sentence_model.half()
+    # PCA and the (multinomial) logistic regression are both linear, so they collapse into one
+    # 384 x n_classes matrix: logits = embeddings @ W_fused + b_fused.
+    W_fused = (pca.components_.T @ model.coef_.T).astype(np.float32)
+    b_fused = (model.intercept_ - pca.mean_ @ W_fused).astype(np.float32)
     print("All local models and encoders loaded successfully.")
 except FileNotFoundError as e:
     print(f"FATAL ERROR: A required model file was not found: {e.name}")
@@ -66,44 +92,94 @@ except FileNotFoundError as e:
 print("-" * 30)
 
 
-# --- [2. CORE FUNCTIONS (Unchanged)] ---
+# --- [2. CORE FUNCTIONS] ---
 
 def get_predictions_and_confidence(descriptions):
     """Encodes descriptions, applies PCA, and returns predictions from the ML model."""
-    embeddings = sentence_model.encode(descriptions)
-    embeddings_pca = pca.transform(embeddings)
-    predictions = model.predict(embeddings_pca)
-    probabilities = model.predict_proba(embeddings_pca)
-    confidence = np.max(probabilities, axis=1)
+    embeddings = sentence_model.encode(descriptions, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True,
+                                       show_progress_bar=False, device=DEVICE)
+    # One GEMM replaces pca.transform + predict + predict_proba (FP16 GPU output is upcast first)
+    logits = embeddings.astype(np.float32) @ W_fused + b_fused
+    # Softmax, matching LogisticRegression.predict_proba for the multinomial model
+    logits -= logits.max(axis=1, keepdims=True)
+    probabilities = np.exp(logits)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    predictions = model.classes_[probabilities.argmax(axis=1)]
+    confidence = probabilities.max(axis=1)
     return predictions, confidence
 
-def generate_llm_explanation(description, category):
-    """(For Task 1) Uses an LLM to generate a human-readable explanation."""
+def llm_cached(llm_function):
+    """Decorator that stores successful LLM responses in the on-disk cache, keyed on the function
+    name and its arguments. Failed calls raise, so fallback text is never cached."""
+    @functools.wraps(llm_function)
+    async def wrapper(*args):
+        key_source = "|".join([llm_function.__name__, *map(str, args)])
+        key = hashlib.blake2b(key_source.encode(), digest_size=16).hexdigest()
+        row = llm_cache.execute('SELECT val FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            return row[0]
+        value = await llm_function(*args)
+        llm_cache.execute('INSERT OR REPLACE INTO cache (key, val) VALUES (?, ?)', (key, value))
+        llm_cache.commit()
+        return value
+    return wrapper
+
+@llm_cached
+async def request_llm_explanation(description, category):
+    """Asks the LLM why a dispute belongs to its predicted category."""
     prompt = f"""You are an AI assistant for a financial support agent. Your task is to explain why a customer's dispute was classified.
     - Customer's Description: "{description}"
     - Predicted Category: {category}
     Explain in one clear sentence why this dispute falls into the '{category}' category, quoting key evidence from the customer's description."""
-    try:
-        response = client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "system", "content": "You write clear, evidence-based explanations."}, {"role": "user", "content": prompt}], temperature=0.0, max_tokens=70)
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Warning: OpenAI API call failed for explanation. Falling back. Error: {e}")
-        return f"Classified as {category} based on semantic analysis."
+    response = await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "system", "content": "You write clear, evidence-based explanations."}, {"role": "user", "content": prompt}], temperature=0.0, max_tokens=70)
+    return response.choices[0].message.content.strip()
 
-def generate_llm_justification(description, category, action):
-    """(For Task 2) Uses an LLM to generate a dynamic justification for an action."""
+@llm_cached
+async def request_llm_justification(description, category, action):
+    """Asks the LLM why the suggested action fits the dispute."""
     prompt = f"""You are an AI assistant helping a financial support agent. A customer dispute has been analyzed.
     - Customer's Description: "{description}"
     - Classified as: {category}
     - Suggested next action: {action}
     Write a brief, one-sentence justification for the agent explaining why '{action}' is the correct next step, connecting it to the customer's complaint."""
+    response = await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "system", "content": "You write clear, actionable justifications for support agents."}, {"role": "user", "content": prompt}], temperature=0.1, max_tokens=80)
+    return response.choices[0].message.content.strip()
+
+async def generate_llm_explanation(description, category):
+    """(For Task 1) Uses an LLM to generate a human-readable explanation."""
     try:
-        response = client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "system", "content": "You write clear, actionable justifications for support agents."}, {"role": "user", "content": prompt}], temperature=0.1, max_tokens=80)
-        return response.choices[0].message.content.strip()
+        return await request_llm_explanation(description, category)
+    except Exception as e:
+        print(f"Warning: OpenAI API call failed for explanation. Falling back. Error: {e}")
+        return f"Classified as {category} based on semantic analysis."
+
+async def generate_llm_justification(description, category, action):
+    """(For Task 2) Uses an LLM to generate a dynamic justification for an action."""
+    try:
+        return await request_llm_justification(description, category, action)
     except Exception as e:
         print(f"Warning: OpenAI API call failed for justification. Falling back. Error: {e}")
         return resolution_rules[category]['justification']
 
+async def run_llm_calls(llm_function, args_list, desc):
+    """Runs an async LLM function over every argument tuple, at most MAX_CONCURRENT_REQUESTS at a time.
+    Results are returned in the same order as args_list."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def call(args):
+        async with semaphore:
+            return await llm_function(*args)
+
+    return await tqdm_asyncio.gather(*(call(args) for args in args_list), total=len(args_list), desc=desc)
+
+async def generate_llm_outputs(explanation_args, justification_args):
+    """Generates all explanations, then all justifications, on one event loop and one client."""
+    print(f"Step 2: Generating explanations via LLM concurrently (up to {MAX_CONCURRENT_REQUESTS} requests in flight)...")
+    explanations = await run_llm_calls(generate_llm_explanation, explanation_args, "Explaining")
+    print(f"Step 3: Generating justifications via LLM concurrently (up to {MAX_CONCURRENT_REQUESTS} requests in flight)...")
+    justifications = await run_llm_calls(generate_llm_justification, justification_args, "Justifying")
+    return explanations, justifications
+
 # --- [3. BUSINESS LOGIC RULES (Unchanged)] ---
 
 resolution_rules = {
@@ -127,15 +203,21 @@ if __name__ == "__main__":
         exit()
     print("-" * 30)
 
-    # --- TASK 1: Dispute Classification & Explanation (Parallelized) ---
+    # --- TASK 1: Dispute Classification ---
     print("Step 1: Running ML model for classification...")
     descriptions = disputes_df['description'].tolist()
     predicted_categories, confidence_scores = get_predictions_and_confidence(descriptions)
-    
-    print(f"Step 2: Generating explanations via LLM in parallel (using up to {MAX_WORKERS} workers)...")
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # executor.map runs the function for each item in the iterables, in parallel.
-        explanations = list(tqdm(executor.map(generate_llm_explanation, descriptions, predicted_categories), total=len(descriptions), desc="Explaining"))
+    # tolist() gives plain Python strings rather than np.str_ scalars for the LLM callbacks
+    categories = predicted_categories.tolist()
+    actions = [resolution_rules[category]['action'] for category in categories]
+
+    # --- TASKS 1 & 2: Explanations and Justifications (Concurrent) ---
+    # Prepare the arguments for each LLM call; every list lines up row-for-row with disputes_df.
+    explanation_args = list(zip(descriptions, categories))
+    justification_args = list(zip(descriptions, categories, actions))
+
+    # Both passes share one event loop so the async client's connection pool is reused throughout.
+    explanations, justifications = asyncio.run(generate_llm_outputs(explanation_args, justification_args))
 
     # CONFIRMATION: The DataFrame columns match the required output format.
     classified_df = pd.DataFrame({
@@ -148,26 +230,10 @@ if __name__ == "__main__":
     print("Successfully generated 'classified_disputes.csv'")
     print("-" * 30)
 
-    # --- TASK 2: Resolution Suggestion & Justification (Parallelized) ---
-    print(f"Step 3: Generating justifications via LLM in parallel (using up to {MAX_WORKERS} workers)...")
-    
-    # First, prepare the arguments for each parallel call
-    justification_args = []
-    for _, row in classified_df.iterrows():
-        category = row['predicted_category']
-        dispute_id = row['dispute_id']
-        original_description = disputes_df.loc[disputes_df['dispute_id'] == dispute_id, 'description'].iloc[0]
-        action = resolution_rules[category]['action']
-        justification_args.append((original_description, category, action))
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Use a lambda function to unpack the tuple of arguments for each call
-        justifications = list(tqdm(executor.map(lambda p: generate_llm_justification(*p), justification_args), total=len(justification_args), desc="Justifying"))
-
     # CONFIRMATION: The DataFrame columns match the required output format.
     resolutions_df = pd.DataFrame({
         'dispute_id': classified_df['dispute_id'],
-        'suggested_action': [resolution_rules[cat]['action'] for cat in classified_df['predicted_category']],
+        'suggested_action': actions,
         'justification': justifications
     })
     resolutions_df.to_csv('resolutions.csv', index=False)
@@ -11,11 +11,31 @@
 # ==============================================================================
 
 import sqlite3
-import pandas as pd
+import csv
 import os
 
 DB_PATH = 'database.db'
 OUTPUT_DIR = '../' # Save to the root project folder
+FETCH_CHUNK_SIZE = 5000 # Rows held in memory at a time while writing
+
+def export_query_to_csv(conn, query, output_path):
+    """
+    Streams the result of a query into a CSV file, chunk by chunk,
+    so memory use stays constant regardless of table size.
+    Returns the number of rows written.
+    """
+    cursor = conn.execute(query)
+    row_count = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+            if not rows:
+                break
+            writer.writerows(rows)
+            row_count += len(rows)
+    return row_count
 
 def export_data():
     """
@@ -32,10 +52,6 @@ def export_data():
     try:
         conn = sqlite3.connect(DB_PATH)
         
-        # Read the entire disputes table into a pandas DataFrame
-        disputes_df = pd.read_sql_query("SELECT * FROM disputes", conn)
-        print(f"Successfully loaded {len(disputes_df)} records from the database.")
-
         # --- Create classified_disputes.csv ---
         classified_columns = [
             'dispute_id',
@@ -43,10 +59,9 @@ def export_data():
             'confidence',
             'explanation'
         ]
-        classified_df = disputes_df[classified_columns]
         classified_output_path = os.path.join(OUTPUT_DIR, 'classified_disputes.csv')
-        classified_df.to_csv(classified_output_path, index=False)
-        print(f"Successfully exported 'classified_disputes.csv' to the project root directory.")
+        row_count = export_query_to_csv(conn, f"SELECT {', '.join(classified_columns)} FROM disputes", classified_output_path)
+        print(f"Successfully exported {row_count} records to 'classified_disputes.csv' in the project root directory.")
         
         # --- Create resolutions.csv ---
         resolutions_columns = [
@@ -54,10 +69,9 @@ def export_data():
             'suggested_action',
             'justification'
         ]
-        resolutions_df = disputes_df[resolutions_columns]
         resolutions_output_path = os.path.join(OUTPUT_DIR, 'resolutions.csv')
-        resolutions_df.to_csv(resolutions_output_path, index=False)
-        print(f"Successfully exported 'resolutions.csv' to the project root directory.")
+        row_count = export_query_to_csv(conn, f"SELECT {', '.join(resolutions_columns)} FROM disputes", resolutions_output_path)
+        print(f"Successfully exported {row_count} records to 'resolutions.csv' in the project root directory.")
         
         print("\n✅ Export process completed successfully!")
 
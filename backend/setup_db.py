@@ -18,10 +18,13 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
-from sentence_transformers import SentenceTransformer
-import openai
+import time
+import asyncio
+import json
+import hashlib
+import functools
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
+from tqdm.asyncio import tqdm_asyncio
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -34,11 +37,33 @@ DB_PATH = 'database.db'
 TRANSACTIONS_CSV_PATH = 'data/2.csv' # I've assumed the name
 DISPUTES_CSV_PATH = 'data/1.csv'
 MODEL_DIR = 'ml_models/'
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+# Exported once and then reused: an INT8 (dynamically quantized) ONNX copy of the encoder for CPU inference
+ONNX_MODEL_DIR = os.path.join(MODEL_DIR, 'all-MiniLM-L6-v2-onnx-int8')
+ONNX_MODEL_FILE = 'model_quantized.onnx'
+ENCODER_MAX_SEQ_LENGTH = 256 # Same truncation as SentenceTransformer uses for this model
 
-# Configure how many LLM calls to make in parallel
-MAX_WORKERS = 10
+# LLM throughput is bounded by the account's rate limits rather than a fixed worker count.
+# Set these to your OpenAI limits for gpt-4o-mini.
+MAX_REQUESTS_PER_MINUTE = 500
+MAX_TOKENS_PER_MINUTE = 200_000
+MAX_ATTEMPTS = 5 # Per request, with exponential backoff on 429s and transient errors
+# Disputes marshalled into each LLM prompt. Sweep 4/8/16 against your rate limits and keep the
+# smallest size past which per-row latency stops improving.
+LLM_BATCH_SIZE = 8
+# On-disk cache of LLM responses, so re-runs only pay for disputes they haven't seen before.
+LLM_CACHE_PATH = 'llm_cache.db'
+# Embeddings of previously seen descriptions, keyed by a 16-byte blake2b hash of encoder + description
+EMBEDDING_CACHE_PATH = os.path.join(MODEL_DIR, 'emb_cache.npz')
+
+# Embedding settings: use every CPU core for the encoder, and FP16 when a GPU is available.
+ENCODE_BATCH_SIZE = 64
+# Worker processes that tokenize upcoming batches while ONNX Runtime runs the current one (none on a single core)
+TOKENIZER_WORKERS = min(4, (os.cpu_count() or 1) - 1)
 
 # --- [1. INITIALIZE CLIENTS AND MODELS] ---
+# Everything here is loaded lazily through get_models(), so importing this module (e.g. to
+# call create_tables) doesn't pay for torch, the encoder or the OpenAI client.
 
 def initialize_openai_client():
     """Initializes the OpenAI client, ensuring the API key is set."""
@@ -46,29 +71,129 @@ def initialize_openai_client():
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("FATAL ERROR: The 'OPENAI_API_KEY' environment variable is not set.")
+    import openai
     try:
-        client = openai.OpenAI(api_key=api_key)
+        # Retries are handled by complete_with_retries, which also respects the rate limiter
+        client = openai.AsyncOpenAI(api_key=api_key, max_retries=0)
         print("OpenAI client initialized successfully.")
         return client
     except Exception as e:
         raise ConnectionError(f"Failed to initialize OpenAI client. Error: {e}")
 
-# Load models and clients globally to be reused
-try:
+def export_onnx_encoder():
+    """
+    One-time export of the sentence encoder to ONNX, quantized to INT8 so the
+    matmuls can use VNNI dot products. The result is cached under ONNX_MODEL_DIR.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    print(f"Exporting '{EMBEDDING_MODEL_NAME}' to ONNX (INT8)...")
+    ort_model = ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL_NAME, export=True)
+    quantizer = ORTQuantizer.from_pretrained(ort_model)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=ONNX_MODEL_DIR, quantization_config=qconfig)
+    AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME).save_pretrained(ONNX_MODEL_DIR)
+
+class OnnxSentenceEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode() backed by ONNX Runtime.
+    Reproduces all-MiniLM-L6-v2's pipeline: transformer -> mean pooling -> L2 normalization.
+    """
+    def __init__(self, model_dir):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, ONNX_MODEL_FILE), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        from torch.utils.data import DataLoader
+
+        # Like SentenceTransformer, encode longest-first to minimise padding, then restore the order
+        order = np.argsort([-len(sentence) for sentence in sentences])
+        # The DataLoader's workers tokenize ahead of the forward passes; a single batch isn't worth the worker startup
+        tokenize = functools.partial(self.tokenizer, padding=True, truncation=True,
+                                     max_length=ENCODER_MAX_SEQ_LENGTH, return_tensors='np')
+        loader = DataLoader([sentences[i] for i in order], batch_size=batch_size, collate_fn=tokenize,
+                            num_workers=TOKENIZER_WORKERS if len(sentences) > batch_size else 0)
+        batches = []
+        for inputs in tqdm(loader, disable=not show_progress_bar, desc="Encoding"):
+            token_embeddings = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        sorted_embeddings = np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        return embeddings
+
+def load_sentence_encoder():
+    """Uses the INT8 ONNX encoder on CPU (exporting it on first use) and PyTorch FP16 on CUDA."""
+    import torch
+    torch.set_num_threads(os.cpu_count())
+    if torch.cuda.is_available():
+        from sentence_transformers import SentenceTransformer
+        sentence_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device='cuda')
+        sentence_model.half()
+        return sentence_model
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)):
+        export_onnx_encoder()
+    return OnnxSentenceEncoder(ONNX_MODEL_DIR)
+
+def open_llm_cache():
+    """Opens (and creates if needed) the SQLite-backed LLM response cache."""
+    conn = sqlite3.connect(LLM_CACHE_PATH)
+    conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, val TEXT)')
+    conn.commit()
+    return conn
+
+@functools.lru_cache(maxsize=1)
+def get_models():
+    """Loads the clients and models on first use and reuses them afterwards.
+    Returns (client, sentence_model, classes, W_fused, b_fused)."""
     print("Loading all models...")
     client = initialize_openai_client()
     with open(os.path.join(MODEL_DIR, 'logistic_regression_model.pkl'), 'rb') as f:
         model = pickle.load(f)
     with open(os.path.join(MODEL_DIR, 'pca.pkl'), 'rb') as f:
         pca = pickle.load(f)
-    sentence_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    sentence_model = load_sentence_encoder()
+    # PCA and the (multinomial) logistic regression are both linear, so they collapse into one
+    # 384 x n_classes matrix: logits = embeddings @ W_fused + b_fused.
+    W_fused = (pca.components_.T @ model.coef_.T).astype(np.float32)
+    b_fused = (model.intercept_ - pca.mean_ @ W_fused).astype(np.float32)
     print("All models loaded successfully.")
-except (FileNotFoundError, ValueError, ConnectionError) as e:
-    print(f"Error during initialization: {e}")
-    exit()
+    return client, sentence_model, model.classes_, W_fused, b_fused
 
 # --- [2. DATABASE SCHEMA AND CREATION] ---
 
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+
+TABLE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_disputes_cat_date ON disputes (predicted_category, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_disputes_status ON disputes (status)',
+    'CREATE INDEX IF NOT EXISTS idx_history_d_t ON dispute_history (dispute_id, "timestamp")',
+    'CREATE INDEX IF NOT EXISTS idx_txn_dup ON transactions (customer_id, merchant, amount, "timestamp")',
+]
+
+def connect_db():
+    """Opens the database with WAL and a large page cache, which also speeds up the bulk inserts."""
+    conn = sqlite3.connect(DB_PATH)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 def create_tables(conn):
     """Creates all necessary tables in the database."""
     cursor = conn.cursor()
@@ -119,63 +244,307 @@ def create_tables(conn):
     )
     ''')
     
+    # Indexes for the category/date filters and history lookups the API and agent run. The history and
+    # transactions ones match app.py's definitions (their prefixes cover dispute_id and customer_id lookups).
+    for statement in TABLE_INDEXES:
+        cursor.execute(statement)
+    
     conn.commit()
     print("Tables created successfully.")
 
 # --- [3. AI PROCESSING LOGIC (Reused from previous scripts)] ---
 
+def load_embedding_cache():
+    if not os.path.exists(EMBEDDING_CACHE_PATH):
+        return {}
+    with np.load(EMBEDDING_CACHE_PATH) as cache:
+        return {key.tobytes(): vec for key, vec in zip(cache['keys'], cache['vecs'])}
+
+def save_embedding_cache(cache):
+    # Keys are stored as raw uint8 rows; an 'S16' array would strip trailing NUL bytes from the digests
+    keys = np.frombuffer(b''.join(cache), dtype=np.uint8).reshape(-1, 16)
+    np.savez(EMBEDDING_CACHE_PATH, keys=keys, vecs=np.stack(list(cache.values())))
+
+def encode_with_cache(sentence_model, descriptions, cache):
+    """
+    Encodes only the descriptions missing from the embedding cache (a dict from
+    load_embedding_cache), then adds them to it. Saving it is left to the caller, once per run.
+    """
+    # The ONNX INT8 and CUDA FP16 encoders give slightly different vectors, so each gets its own keys
+    encoder_name = type(sentence_model).__name__
+    keys = [hashlib.blake2b(f"{encoder_name}|{d}".encode(), digest_size=16).digest() for d in descriptions]
+    # First occurrence of each uncached key, so repeated descriptions are encoded once
+    miss_idx = list({key: i for i, key in reversed(list(enumerate(keys))) if key not in cache}.values())
+    print(f"Embedding cache: {sum(key in cache for key in keys)} hits, {len(miss_idx)} to encode.")
+    if miss_idx:
+        # encode() already sorts inputs by length to minimise padding and restores the original order.
+        new_embeddings = sentence_model.encode([descriptions[i] for i in miss_idx], batch_size=ENCODE_BATCH_SIZE,
+                                               convert_to_numpy=True, normalize_embeddings=False, show_progress_bar=True)
+        for i, vec in zip(miss_idx, new_embeddings.astype(np.float32)):
+            cache[keys[i]] = vec
+    return np.stack([cache[key] for key in keys])
+
+@functools.lru_cache(maxsize=1)
+def get_fused_predict():
+    """
+    Compiles (once, on first use) a numba kernel that takes each row's argmax and top softmax
+    probability in a single pass over the logits, without allocating a probability matrix.
+    """
+    import math
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def fused_predict(logits):
+        n, k = logits.shape
+        pred = np.empty(n, np.int64)
+        conf = np.empty(n, np.float32)
+        for i in prange(n):
+            ai = 0
+            for j in range(1, k):
+                if logits[i, j] > logits[i, ai]:
+                    ai = j
+            mx = logits[i, ai]
+            s = 0.0
+            for j in range(k):
+                s += math.exp(logits[i, j] - mx)
+            pred[i] = ai
+            conf[i] = 1.0 / s
+        return pred, conf
+
+    return fused_predict
+
 # (These functions are copied from your main processing script)
-def get_predictions_and_confidence(descriptions):
-    embeddings = sentence_model.encode(descriptions)
-    embeddings_pca = pca.transform(embeddings)
-    predictions = model.predict(embeddings_pca)
-    probabilities = model.predict_proba(embeddings_pca)
-    confidence = np.max(probabilities, axis=1)
+def get_predictions_and_confidence(descriptions, embedding_cache):
+    _, sentence_model, classes, W_fused, b_fused = get_models()
+    embeddings = encode_with_cache(sentence_model, descriptions, embedding_cache)
+    # One GEMM replaces pca.transform + the logistic regression (FP16 GPU output is upcast first)
+    logits = embeddings.astype(np.float32) @ W_fused + b_fused
+    # Only the argmax and the top softmax probability are needed: exp(max - logsumexp) = 1 / sum(exp(logits - max))
+    predicted_idx, confidence = get_fused_predict()(logits)
+    predictions = classes[predicted_idx]
     return predictions, confidence
 
-def generate_llm_explanation(description, category):
-    prompt = f"Explain in one sentence why this dispute: '{description}' was classified as '{category}', quoting key evidence."
+class RateLimiter:
+    """
+    Token buckets for requests/minute and tokens/minute (as in OpenAI's
+    api_request_parallel_processor). Capacity refills continuously; acquire()
+    waits until both buckets can cover the next request.
+    """
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.available_requests = requests_per_minute
+        self.available_tokens = tokens_per_minute
+        self.last_update = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self.last_update) / 60
+        self.available_requests = min(self.requests_per_minute, self.available_requests + elapsed_minutes * self.requests_per_minute)
+        self.available_tokens = min(self.tokens_per_minute, self.available_tokens + elapsed_minutes * self.tokens_per_minute)
+        self.last_update = now
+
+    async def acquire(self, token_cost):
+        while True:
+            self._refill()
+            if self.available_requests >= 1 and self.available_tokens >= token_cost:
+                self.available_requests -= 1
+                self.available_tokens -= token_cost
+                return
+            await asyncio.sleep(0.01)
+
+async def complete_with_retries(limiter, prompt, temperature, max_tokens, **request_kwargs):
+    """
+    Sends one chat completion through the rate limiter, backing off exponentially on 429s and on
+    the transient errors the SDK would otherwise retry (connection errors, timeouts, 5xx).
+    """
+    import openai
+    client = get_models()[0]
+    # Rough token estimate (~4 characters per token) plus the completion budget
+    token_cost = len(prompt) // 4 + max_tokens
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.acquire(token_cost)
+        try:
+            response = await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=temperature, max_tokens=max_tokens, **request_kwargs)
+            return response.choices[0].message.content.strip()
+        except (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                openai.InternalServerError):
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+def fallback_llm_outputs(category, action):
+    return (f"Classified as {category} based on semantic analysis.",
+            f"Action '{action}' is recommended for disputes of type '{category}'.")
+
+async def generate_llm_both(limiter, description, category, action):
+    """
+    Asks for the explanation and the justification in one JSON-mode call, since both share the same context.
+    Returns None if the call fails or the response is incomplete.
+    """
+    import openai
+    prompt = (f"A customer dispute with description '{description}' was classified as '{category}' and the suggested action is '{action}'. "
+              f"Respond with a JSON object with two keys: \"explanation\", one sentence explaining why the dispute was classified as '{category}', quoting key evidence; "
+              f"and \"justification\", one sentence explaining why '{action}' is the correct next step for a support agent.")
     try:
-        response = client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0.0, max_tokens=70)
-        return response.choices[0].message.content.strip()
-    except Exception: return f"Classified as {category} based on semantic analysis."
+        content = await complete_with_retries(limiter, prompt, temperature=0.0, max_tokens=160, response_format={"type": "json_object"})
+        parsed = json.loads(content)
+    except (openai.APIError, json.JSONDecodeError) as e:
+        print(f"LLM request failed, using fallback text. Error: {e}")
+        return None
+    if not (isinstance(parsed, dict) and parsed.get('explanation') and parsed.get('justification')): return None
+    return parsed['explanation'], parsed['justification']
 
-def generate_llm_justification(description, category, action):
-    prompt = f"For a dispute classified as '{category}' with description '{description}', explain in one sentence why the action '{action}' is the correct next step for a support agent."
+async def generate_llm_batch(limiter, batch):
+    """
+    Asks for explanations and justifications for several disputes in one prompt.
+    If the request fails or the response doesn't line up one-to-one with the batch (by id), each row is retried on its own.
+    """
+    import openai
+    disputes = [{"id": i, "description": d, "category": c, "action": a} for i, (d, c, a) in enumerate(batch)]
+    prompt = ("For each of the following customer disputes, write \"explanation\" (one sentence on why the dispute was classified as its category, quoting key evidence) "
+              "and \"justification\" (one sentence on why its action is the correct next step for a support agent). "
+              "Respond with a JSON object {\"results\": [{\"id\": ..., \"explanation\": ..., \"justification\": ...}, ...]} containing one entry per dispute, in order.\n"
+              f"Disputes: {json.dumps(disputes)}")
     try:
-        response = client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0.1, max_tokens=80)
-        return response.choices[0].message.content.strip()
-    except Exception: return f"Action '{action}' is recommended for disputes of type '{category}'."
+        content = await complete_with_retries(limiter, prompt, temperature=0.0, max_tokens=160 * len(batch), response_format={"type": "json_object"})
+        results = json.loads(content)['results']
+    except (openai.APIError, json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"LLM batch request failed, retrying its {len(batch)} disputes one by one. Error: {e}")
+    else:
+        # Every id sent must come back exactly once, otherwise outputs could land on the wrong dispute
+        well_formed = isinstance(results, list) and all(isinstance(r, dict) and type(r.get('id')) is int for r in results)
+        ids_match = well_formed and sorted(r['id'] for r in results) == list(range(len(batch)))
+        if ids_match and all(r.get('explanation') and r.get('justification') for r in results):
+            return [(r['explanation'], r['justification']) for r in sorted(results, key=lambda r: r['id'])]
+    return await asyncio.gather(*(generate_llm_both(limiter, d, c, a) for d, c, a in batch))
+
+def llm_cache_key(description, category, action):
+    return hashlib.blake2b("|".join([category, action, description]).encode(), digest_size=16).hexdigest()
+
+async def generate_llm_enrichments(limiter, descriptions, categories, actions):
+    """
+    Returns explanations and justifications in row order. Repeated rows are requested once,
+    rows already in the on-disk cache are not requested at all, and the rest are sent
+    LLM_BATCH_SIZE disputes per request. Fallback text is used for failures and never cached.
+    The limiter is shared across chunks, so its budget holds for the whole run.
+    """
+    rows = list(zip(descriptions, categories, actions))
+    llm_cache = open_llm_cache()
+    outputs = {}
+    pending = []
+    for row in dict.fromkeys(rows):
+        cached = llm_cache.execute('SELECT val FROM cache WHERE key = ?', (llm_cache_key(*row),)).fetchone()
+        if cached is not None:
+            outputs[row] = tuple(json.loads(cached[0]))
+        else:
+            pending.append(row)
+    print(f"LLM cache: {len(outputs)} hits, {len(pending)} to request.")
+
+    batches = [pending[start:start + LLM_BATCH_SIZE] for start in range(0, len(pending), LLM_BATCH_SIZE)]
+    # tqdm_asyncio.gather ticks as each batch completes (not in submission order) and still returns
+    # results in order; mininterval keeps redraws cheap when many batches finish together.
+    batch_results = await tqdm_asyncio.gather(*(generate_llm_batch(limiter, batch) for batch in batches),
+                                              total=len(batches), desc="LLM batches", mininterval=0.5)
+    results = [result for batch in batch_results for result in batch]
+    for row, result in zip(pending, results):
+        if result is None:
+            outputs[row] = fallback_llm_outputs(row[1], row[2])
+        else:
+            outputs[row] = result
+            llm_cache.execute('INSERT OR REPLACE INTO cache (key, val) VALUES (?, ?)', (llm_cache_key(*row), json.dumps(result)))
+    llm_cache.commit()
+    llm_cache.close()
+    return [outputs[row][0] for row in rows], [outputs[row][1] for row in rows]
 
 # --- [4. DATA POPULATION LOGIC] ---
 
+# Only the columns the pipeline uses are parsed, as pandas' string dtype rather than object.
+DISPUTES_CSV_DTYPES = {
+    'dispute_id': 'string', 'customer_id': 'string', 'txn_id': 'string',
+    'description': 'string', 'created_at': 'string'
+}
+DISPUTES_CHUNK_SIZE = 1000
+
+TRANSACTION_INSERT_COLUMNS = ['txn_id', 'customer_id', 'amount', 'status', 'timestamp', 'channel', 'merchant']
+TRANSACTION_INSERT_QUERY = ('INSERT INTO transactions (txn_id, customer_id, amount, status, "timestamp", channel, merchant) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?)')
+
+DISPUTE_INSERT_COLUMNS = [
+    'dispute_id', 'customer_id', 'txn_id', 'description', 'predicted_category',
+    'confidence', 'explanation', 'suggested_action', 'justification', 'created_at', 'status'
+]
+DISPUTE_INSERT_QUERY = (f"INSERT INTO disputes ({', '.join(DISPUTE_INSERT_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(DISPUTE_INSERT_COLUMNS))})")
+
 def populate_database(conn):
     """Reads CSVs, processes data, and inserts into the database."""
     
     # 4.1 Populate Transactions Table
     print("\nPopulating 'transactions' table...")
     try:
-        trans_df = pd.read_csv(TRANSACTIONS_CSV_PATH)
-        # The column name in the CSV is 'timestamp', which is a keyword.
-        # We need to make sure it maps correctly to our schema.
-        trans_df.to_sql('transactions', conn, if_exists='replace', index=False)
+        trans_df = pd.read_csv(TRANSACTIONS_CSV_PATH, usecols=TRANSACTION_INSERT_COLUMNS)[TRANSACTION_INSERT_COLUMNS]
+        # Append into the table from create_tables (keeping its constraints and indexes) with one
+        # prepared INSERT in a single transaction. 'timestamp' is quoted in the query since it's a keyword.
+        with conn:
+            conn.executemany(TRANSACTION_INSERT_QUERY, trans_df.itertuples(index=False, name=None))
         print(f"Successfully inserted {len(trans_df)} rows into 'transactions' table.")
     except FileNotFoundError:
         print(f"WARNING: '{TRANSACTIONS_CSV_PATH}' not found. Skipping population of transactions table.")
 
     # 4.2 Process and Populate Disputes Table
     print("\nPopulating 'disputes' table (This will run the AI pipeline)...")
+    # The CSV is streamed in chunks so only one chunk's embeddings and LLM results are held at a time.
     try:
-        disputes_df = pd.read_csv(DISPUTES_CSV_PATH)
+        chunks = pd.read_csv(DISPUTES_CSV_PATH, chunksize=DISPUTES_CHUNK_SIZE,
+                             usecols=list(DISPUTES_CSV_DTYPES), dtype=DISPUTES_CSV_DTYPES)
     except FileNotFoundError:
         print(f"FATAL ERROR: '{DISPUTES_CSV_PATH}' not found. Cannot populate disputes.")
         return
 
+    try:
+        get_models()
+    except (FileNotFoundError, ValueError, ConnectionError) as e:
+        print(f"Error during initialization: {e}")
+        exit()
+
+    # The embedding cache is read once here and written once after the last chunk (or on failure,
+    # keeping what was encoded so far), rather than reloaded and rewritten for every chunk.
+    embedding_cache = load_embedding_cache()
+    cached_embeddings = len(embedding_cache)
+    # One event loop and one rate limiter for the whole run: the cached AsyncOpenAI client is bound
+    # to the loop it first ran on, and a per-chunk limiter would reset the RPM/TPM budget every chunk.
+    loop = asyncio.new_event_loop()
+    limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE)
+    total_inserted = 0
+    try:
+        for chunk_number, disputes_df in enumerate(chunks, start=1):
+            print(f"\nProcessing chunk {chunk_number} ({len(disputes_df)} disputes)...")
+            final_disputes_df = process_disputes_chunk(disputes_df, embedding_cache, loop, limiter)
+            # Insert into the table from create_tables (to_sql 'replace' would drop its constraints),
+            # as one executemany inside a single transaction per chunk. Missing strings go in as NULL,
+            # which needs an object-dtype copy, so that's only made for chunks that have any.
+            if final_disputes_df.isna().to_numpy().any():
+                final_disputes_df = final_disputes_df.astype(object).where(final_disputes_df.notna(), None)
+            with conn:
+                conn.executemany(DISPUTE_INSERT_QUERY, final_disputes_df.itertuples(index=False, name=None))
+            total_inserted += len(final_disputes_df)
+    finally:
+        loop.close()
+        if len(embedding_cache) > cached_embeddings:
+            save_embedding_cache(embedding_cache)
+    print(f"\nSuccessfully inserted {total_inserted} rows into 'disputes' table.")
+
+def process_disputes_chunk(disputes_df, embedding_cache, loop, limiter):
+    """
+    Runs the AI pipeline over one chunk of disputes and returns it shaped for the 'disputes' table.
+    New embeddings are added to embedding_cache, which the caller saves. The LLM requests run on
+    the caller's event loop through its rate limiter.
+    """
     # --- Run the full AI pipeline ---
     print("Step A: Running ML model for classification...")
     descriptions = disputes_df['description'].tolist()
-    predicted_categories, confidence_scores = get_predictions_and_confidence(descriptions)
-    disputes_df['predicted_category'] = predicted_categories
+    predicted_categories, confidence_scores = get_predictions_and_confidence(descriptions, embedding_cache)
     disputes_df['confidence'] = confidence_scores
 
     resolution_rules = {
@@ -183,31 +552,29 @@ def populate_database(conn):
         "FRAUD": "Mark as potential fraud", "REFUND_PENDING": "Ask for more info",
         "OTHERS": "Manual review"
     }
-    disputes_df['suggested_action'] = disputes_df['predicted_category'].map(resolution_rules)
+    # With only five categories, a Categorical stores int8 codes and the action mapping
+    # becomes a relabelling of the five categories rather than a per-row dict lookup.
+    # Any label outside the rules is kept as an extra category and gets the OTHERS action.
+    unknown_categories = sorted(set(predicted_categories) - resolution_rules.keys())
+    category_codes = pd.Categorical(predicted_categories, categories=list(resolution_rules) + unknown_categories)
+    disputes_df['predicted_category'] = category_codes
+    suggested_actions = pd.Series(category_codes.map(resolution_rules, na_action='ignore'),
+                                  index=disputes_df.index, dtype=object)
+    disputes_df['suggested_action'] = suggested_actions.fillna(resolution_rules["OTHERS"])
 
-    print(f"Step B: Generating explanations via LLM (in parallel)...")
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        explanations = list(tqdm(executor.map(generate_llm_explanation, disputes_df['description'], disputes_df['predicted_category']), total=len(disputes_df)))
+    print(f"Step B: Generating explanations and justifications via LLM (rate-limited to {MAX_REQUESTS_PER_MINUTE} RPM / {MAX_TOKENS_PER_MINUTE} TPM)...")
+    explanations, justifications = loop.run_until_complete(generate_llm_enrichments(
+        limiter, disputes_df['description'].tolist(), disputes_df['predicted_category'].tolist(), disputes_df['suggested_action'].tolist()))
     disputes_df['explanation'] = explanations
-
-    print(f"Step C: Generating justifications via LLM (in parallel)...")
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        justifications = list(tqdm(executor.map(generate_llm_justification, disputes_df['description'], disputes_df['predicted_category'], disputes_df['suggested_action']), total=len(disputes_df)))
     disputes_df['justification'] = justifications
     
     # --- Prepare final DataFrame for DB insertion ---
-    # Select and rename columns to match the 'disputes' table schema
-    final_disputes_df = disputes_df[[
-        'dispute_id', 'customer_id', 'txn_id', 'description', 'predicted_category',
-        'confidence', 'explanation', 'suggested_action', 'justification', 'created_at'
-    ]].copy()
-    
     # ***** THIS IS THE CRITICAL FIX *****
     # Add the default status column before saving to the database.
-    final_disputes_df['status'] = 'OPEN'
-    
-    final_disputes_df.to_sql('disputes', conn, if_exists='replace', index=False)
-    print(f"\nSuccessfully inserted {len(final_disputes_df)} rows into 'disputes' table.")
+    disputes_df['status'] = 'OPEN'
+    # Select the columns in the 'disputes' table's insert order; the chunk isn't used
+    # afterwards, so there's no need for a defensive copy.
+    return disputes_df[DISPUTE_INSERT_COLUMNS]
 
 
 # --- [5. MAIN EXECUTION] ---
@@ -220,7 +587,7 @@ if __name__ == "__main__":
 
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect_db()
         create_tables(conn)
         populate_database(conn)
         print("\n✅ Database setup completed successfully!")
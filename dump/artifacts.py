@@ -0,0 +1,29 @@
+"""
+Shared loader for the pickled models used by the prediction scripts
+"""
+
+import os
+import pickle
+import functools
+import joblib
+import numpy as np
+
+@functools.lru_cache(maxsize=None)
+def load_artifact(pickle_path):
+    """
+    Load a pickle through a joblib copy saved next to it, so its NumPy arrays are
+    memory-mapped from disk instead of deserialized. The copy is written on first use
+    and rewritten whenever the pickle is newer (e.g. after a retrain).
+    """
+    joblib_path = os.path.splitext(pickle_path)[0] + '.joblib'
+    if not os.path.exists(joblib_path) or os.path.getmtime(pickle_path) > os.path.getmtime(joblib_path):
+        with open(pickle_path, 'rb') as f:
+            obj = pickle.load(f)
+        # Linear models score in float32, so their weights are stored that way
+        if hasattr(obj, 'coef_'):
+            obj.coef_ = obj.coef_.astype(np.float32)
+            obj.intercept_ = obj.intercept_.astype(np.float32)
+        # Written aside and swapped in, so processes still mapping the old copy aren't affected
+        joblib.dump(obj, joblib_path + '.tmp', compress=0, protocol=5)
+        os.replace(joblib_path + '.tmp', joblib_path)
+    return joblib.load(joblib_path, mmap_mode='r')
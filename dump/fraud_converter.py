@@ -3,10 +3,16 @@
 Script to convert fraud.txt to CSV format and analyze class distribution.
 """
 
+import re
 import pandas as pd
 import csv
 from collections import Counter
 
+# Define the expected categories to help with parsing. One compiled alternation matches
+# whichever category ends a space-separated line, instead of an endswith() check per category.
+CATEGORIES = ('DUPLICATE_CHARGE', 'FAILED_TRANSACTION', 'FRAUD', 'REFUND_PENDING', 'OTHERS')
+CAT_RE = re.compile(r'^(.*) (' + '|'.join(CATEGORIES) + r')$')
+
 def convert_txt_to_csv(input_file, output_file):
     """
     Convert the fraud.txt file to CSV format.
@@ -19,63 +25,36 @@ def convert_txt_to_csv(input_file, output_file):
     Returns:
         pd.DataFrame: The converted DataFrame
     """
-    # Read the file and parse it
-    data = []
-    
-    # Define the expected categories to help with parsing
-    categories = {'DUPLICATE_CHARGE', 'FAILED_TRANSACTION', 'FRAUD', 'REFUND_PENDING', 'OTHERS'}
-    
     with open(input_file, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-        
-        # Skip the first empty line and get the header
-        header_line = lines[1].strip()
-        headers = header_line.split('\t')
-        
-        # Process data lines (starting from line 2, index 2)
-        for line_num, line in enumerate(lines[2:], start=3):
-            line = line.strip()
-            if line:  # Skip empty lines
-                # Try tab-separated format first
-                if '\t' in line:
-                    parts = line.split('\t')
-                    if len(parts) >= 3:
-                        dispute_id = parts[0]
-                        # Join all parts except first and last as description (in case description has tabs)
-                        description = '\t'.join(parts[1:-1])
-                        category = parts[-1]
-                        data.append([dispute_id, description, category])
-                        continue
-                
-                # If tab-separated doesn't work, try space-separated format
-                # Look for the category at the end of the line
-                found_category = None
-                for cat in categories:
-                    if line.endswith(' ' + cat):
-                        found_category = cat
-                        break
-                
-                if found_category:
-                    # Extract the part before the category
-                    prefix = line[:-len(found_category)-1].strip()
-                    
-                    # Split the prefix to get dispute_id and description
-                    parts = prefix.split(' ', 1)  # Split into at most 2 parts
-                    if len(parts) >= 2:
-                        dispute_id = parts[0]
-                        description = parts[1]
-                        data.append([dispute_id, description, found_category])
-                    elif len(parts) == 1:
-                        # Only dispute_id found, description is empty
-                        dispute_id = parts[0]
-                        description = ""
-                        data.append([dispute_id, description, found_category])
-                else:
-                    # If we can't parse the line, print a warning and skip
-                    print(f"Warning: Could not parse line {line_num}: {line[:100]}...")
+        lines = file.read().split('\n')
+    
+    # Skip the first empty line and the header; data starts on line 3 of the file
+    lines = pd.Series(lines[2:], index=range(3, len(lines) + 1), dtype=object).str.strip()
+    lines = lines[lines != '']
+    
+    # Tab-separated rows: first field is the dispute_id, last is the category, and
+    # everything in between is the description (in case the description has tabs)
+    tab_rows = lines[lines.str.contains('\t', regex=False)].str.extract(r'^([^\t]*)\t(.*)\t([^\t]*)$').dropna()
+    tab_rows.columns = ['dispute_id', 'description', 'category']
+    
+    # Otherwise, fall back to space-separated rows with a known category at the end
+    remaining = lines.drop(tab_rows.index)
+    space_rows = remaining.str.extract(CAT_RE).dropna()
+    space_rows.columns = ['prefix', 'category']
+    # Split the prefix to get dispute_id and description (which may be empty)
+    prefix_parts = space_rows['prefix'].str.strip().str.split(' ', n=1, expand=True).reindex(columns=[0, 1])
+    space_rows = pd.DataFrame({
+        'dispute_id': prefix_parts[0],
+        'description': prefix_parts[1].fillna(''),
+        'category': space_rows['category'],
+    })
+    
+    # If we can't parse a line, print a warning and skip it
+    for line_num, line in remaining.drop(space_rows.index).items():
+        print(f"Warning: Could not parse line {line_num}: {line[:100]}...")
     
     # Create DataFrame
-    df = pd.DataFrame(data, columns=['dispute_id', 'description', 'category'])
+    df = pd.concat([tab_rows, space_rows]).sort_index().reset_index(drop=True)
     
     # Save to CSV
     df.to_csv(output_file, index=False, quoting=csv.QUOTE_ALL)
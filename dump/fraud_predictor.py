@@ -4,16 +4,20 @@ Fraud Category Prediction System
 Uses pre-trained Logistic Regression model to predict fraud categories from descriptions
 """
 
-import pickle
+import os
+import joblib
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import LabelEncoder
 import re
 import warnings
+from artifacts import load_artifact
 warnings.filterwarnings('ignore')
 
 class FraudPredictor:
+    # Text cleanup patterns, compiled once for every predictor
+    _WS = re.compile(r'\s+')
+    _SPECIAL = re.compile(r'[^\w\s.,!?-]')
+    
     def __init__(self, model_path='/Users/pranavnair/ml_oasis/Logistic Regression Model.pkl'):
         """
         Initialize the fraud predictor with the trained model
@@ -22,6 +26,8 @@ class FraudPredictor:
             model_path (str): Path to the pickle file containing the trained model
         """
         self.model_path = model_path
+        # Preprocessing components fitted by setup_preprocessing, saved next to the model
+        self.fitted_path = os.path.splitext(model_path)[0] + '_fitted.joblib'
         self.model = None
         self.vectorizer = None
         self.label_encoder = None
@@ -30,16 +36,20 @@ class FraudPredictor:
         # Load the model
         self.load_model()
         
-        # If model doesn't include preprocessing components, create them from training data
+        # If model doesn't include preprocessing components, reuse the ones fitted on a previous
+        # run, or create them from training data
         if self.vectorizer is None or self.label_encoder is None:
-            self.setup_preprocessing()
+            if os.path.exists(self.fitted_path):
+                self.vectorizer, self.label_encoder = joblib.load(self.fitted_path)
+                print("✓ Loaded saved preprocessing components")
+            else:
+                self.setup_preprocessing()
     
     def load_model(self):
         """Load the trained model from pickle file"""
         try:
             print("Loading trained model...")
-            with open(self.model_path, 'rb') as f:
-                model_data = pickle.load(f)
+            model_data = load_artifact(self.model_path)
             
             # Handle different pickle formats
             if isinstance(model_data, dict):
@@ -61,11 +71,35 @@ class FraudPredictor:
         """Setup preprocessing components if not included in the pickle file"""
         print("Setting up preprocessing components...")
         
+        # Only needed when the components have to be fitted, so not imported at module load
+        from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+        from sklearn.preprocessing import LabelEncoder
+        
         # Load training data to fit preprocessing components
         try:
             df = pd.read_csv('/Users/pranavnair/ml_oasis/fraud_data_cleaned.csv')
         except:
-            df = pd.read_csv('/Users/pranavnair/ml_oasis/fraud_data.csv')
+            try:
+                df = pd.read_csv('/Users/pranavnair/ml_oasis/fraud_data.csv')
+            except FileNotFoundError:
+                df = None
+        
+        if df is None:
+            # No training data to learn a vocabulary from: hash tokens into the 177 features the
+            # model expects, which needs no fit pass (feature columns won't match training exactly)
+            print("Warning: training data not found, falling back to a HashingVectorizer")
+            self.vectorizer = HashingVectorizer(
+                n_features=177,
+                stop_words='english',
+                lowercase=True,
+                ngram_range=(1, 1),
+                alternate_sign=False,
+                norm='l2'
+            )
+            self.label_encoder = LabelEncoder()
+            self.label_encoder.fit(self.categories)
+            print("✓ Preprocessing components setup complete")
+            return
         
         # Setup TF-IDF Vectorizer with parameters that match the trained model
         # The model expects 177 features, so we'll use max_features=177
@@ -81,6 +115,9 @@ class FraudPredictor:
         self.label_encoder = LabelEncoder()
         self.label_encoder.fit(df['category'])
         
+        # Save the fitted components so later runs skip reading and tokenizing the CSV
+        joblib.dump((self.vectorizer, self.label_encoder), self.fitted_path)
+        
         print("✓ Preprocessing components setup complete")
     
     def preprocess_text(self, text):
@@ -96,14 +133,26 @@ class FraudPredictor:
         # Convert to lowercase
         text = text.lower().strip()
         
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
         # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s.,!?-]', '', text)
+        text = self._SPECIAL.sub('', text)
+        
+        # Remove extra whitespace (after removing specials, so they don't leave double spaces)
+        text = self._WS.sub(' ', text)
         
         return text
     
+    def preprocess_many(self, texts):
+        """
+        Preprocess a list of input text descriptions
+        
+        Args:
+            texts (list): Input description texts
+            
+        Returns:
+            list: Cleaned texts
+        """
+        return list(map(self.preprocess_text, texts))
+    
     def predict_single(self, description):
         """
         Predict the fraud category for a single description
@@ -114,21 +163,36 @@ class FraudPredictor:
         Returns:
             dict: Prediction results with category, probability, and confidence scores
         """
+        return self.predict_batch([description])[0]
+    
+    def predict_batch(self, descriptions):
+        """
+        Predict categories for multiple descriptions
+        
+        The whole batch is vectorized and scored in one transform/predict_proba call,
+        rather than one sparse row at a time.
+        
+        Args:
+            descriptions (list): List of description texts
+            
+        Returns:
+            list: List of prediction dictionaries
+        """
         # Preprocess the text
-        cleaned_text = self.preprocess_text(description)
+        cleaned_texts = self.preprocess_many(descriptions)
         
         # Vectorize the text
-        text_vector = self.vectorizer.transform([cleaned_text])
+        text_vectors = self.vectorizer.transform(cleaned_texts)
         
-        # Make prediction
-        prediction = self.model.predict(text_vector)[0]
-        probabilities = self.model.predict_proba(text_vector)[0]
+        # Make predictions (one predict_proba pass; the predicted class is its argmax)
+        probabilities = self.model.predict_proba(text_vectors)
+        predictions = self.model.classes_[probabilities.argmax(axis=1)]
         
-        # Convert prediction back to category name
+        # Convert predictions back to category names
         if hasattr(self.label_encoder, 'inverse_transform'):
-            predicted_category = self.label_encoder.inverse_transform([prediction])[0]
+            predicted_categories = self.label_encoder.inverse_transform(predictions)
         else:
-            predicted_category = self.categories[prediction]
+            predicted_categories = [self.categories[prediction] for prediction in predictions]
         
         # Get confidence scores for all categories
         if hasattr(self.label_encoder, 'classes_'):
@@ -136,34 +200,19 @@ class FraudPredictor:
         else:
             category_names = self.categories
         
-        confidence_scores = {}
-        for i, category in enumerate(category_names):
-            confidence_scores[category] = round(probabilities[i] * 100, 2)
-        
-        # Sort by confidence
-        sorted_scores = dict(sorted(confidence_scores.items(), key=lambda x: x[1], reverse=True))
-        
-        return {
-            'predicted_category': predicted_category,
-            'confidence': round(max(probabilities) * 100, 2),
-            'all_probabilities': sorted_scores,
-            'cleaned_text': cleaned_text
-        }
-    
-    def predict_batch(self, descriptions):
-        """
-        Predict categories for multiple descriptions
+        percentages = np.round(probabilities * 100, 2)
+        confidences = np.round(probabilities.max(axis=1) * 100, 2)
+        # Sort by confidence (stable, so ties keep the category order)
+        orders = np.argsort(-percentages, axis=1, kind='stable')
         
-        Args:
-            descriptions (list): List of description texts
-            
-        Returns:
-            list: List of prediction dictionaries
-        """
         results = []
-        for desc in descriptions:
-            result = self.predict_single(desc)
-            results.append(result)
+        for i, cleaned_text in enumerate(cleaned_texts):
+            results.append({
+                'predicted_category': predicted_categories[i],
+                'confidence': confidences[i],
+                'all_probabilities': {category_names[j]: percentages[i, j] for j in orders[i]},
+                'cleaned_text': cleaned_text
+            })
         return results
     
     def interactive_prediction(self):
@@ -1,24 +1,80 @@
 # Load the saved model (Logistic Regression, LightGBM, or XGBoost) and the saved PCA object.
-import pickle
+import os
+import functools
 from sklearn.decomposition import PCA
-from sentence_transformers import SentenceTransformer
 from sklearn.preprocessing import LabelEncoder
 import numpy as np
+from artifacts import load_artifact
+
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+ONNX_MODEL_DIR = 'all-MiniLM-L6-v2-onnx-int8'
+ONNX_MODEL_FILE = 'model_quantized.onnx'
+ENCODE_BATCH_SIZE = 64
+
+# Each pickle is memory-mapped through a joblib copy of it (see artifacts.load_artifact), so
+# the PCA components and coefficients aren't deserialized
 
 # Load Logistic Regression model
-with open('logistic_regression_model.pkl', 'rb') as f:
-    loaded_log_reg_model = pickle.load(f)
+loaded_log_reg_model = load_artifact('logistic_regression_model.pkl')
 
 # Load the PCA object
-with open('pca.pkl', 'rb') as f:
-    loaded_pca = pickle.load(f)
+loaded_pca = load_artifact('pca.pkl')
 
 # Load the LabelEncoder object (only needed for XGBoost, but loading it here for completeness if you switch models)
-with open('label_encoder.pkl', 'rb') as f:
-    loaded_label_encoder = pickle.load(f)
+loaded_label_encoder = load_artifact('label_encoder.pkl')
+
+# PCA and the logistic regression are both linear, so they fold into one 384 x n_classes matrix
+W_fused = (loaded_pca.components_.T @ loaded_log_reg_model.coef_.T).astype(np.float32)
+b_fused = (loaded_log_reg_model.intercept_ - loaded_pca.mean_ @ W_fused).astype(np.float32)
+
+
+def export_onnx_encoder():
+    """
+    One-time export of the sentence encoder to INT8 ONNX under ONNX_MODEL_DIR. Downloads the
+    model, so it needs network access; run `python inference.py --export` to do it ahead of time.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    ort_model = ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL_NAME, export=True, provider='CPUExecutionProvider')
+    quantizer = ORTQuantizer.from_pretrained(ort_model)
+    quantizer.quantize(save_dir=ONNX_MODEL_DIR,
+                       quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False))
+    AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME).save_pretrained(ONNX_MODEL_DIR)
 
-# Load the sentence transformer model
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+
+@functools.lru_cache(maxsize=None)
+def get_encoder():
+    """
+    Loads the INT8 ONNX sentence encoder and its tokenizer on first use (exporting them
+    if they haven't been yet) and reuses them afterwards. Returns (tokenizer, model).
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)):
+        export_onnx_encoder()
+    tokenizer = AutoTokenizer.from_pretrained(ONNX_MODEL_DIR)
+    model = ORTModelForFeatureExtraction.from_pretrained(ONNX_MODEL_DIR, file_name=ONNX_MODEL_FILE, provider='CPUExecutionProvider')
+    return tokenizer, model
+
+
+def encode(descriptions, batch_size=ENCODE_BATCH_SIZE):
+    """
+    Same embeddings as SentenceTransformer.encode for this model: mean pooling over
+    the attention mask followed by L2 normalization.
+    """
+    tokenizer, model = get_encoder()
+    batches = []
+    for start in range(0, len(descriptions), batch_size):
+        inputs = tokenizer(descriptions[start:start + batch_size], padding=True, truncation=True,
+                           max_length=256, return_tensors='np')
+        token_embeddings = model(**inputs).last_hidden_state
+        mask = inputs['attention_mask'].astype(np.float32)
+        pooled = np.einsum('bsd,bs->bd', token_embeddings, mask) / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+        batches.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+    return np.concatenate(batches)
 
 
 def predict_new_data(new_descriptions):
@@ -33,14 +89,11 @@ def predict_new_data(new_descriptions):
     """
     # Preprocessing steps:
     # 1. Generate embeddings
-    embeddings = model.encode(new_descriptions)
-
-    # 2. Apply PCA
-    preprocessed_embeddings = loaded_pca.transform(embeddings)
+    embeddings = encode(new_descriptions)
 
-    # Inference step:
-    # Make predictions using the loaded model
-    predictions_encoded = loaded_log_reg_model.predict(preprocessed_embeddings)
+    # 2. Apply PCA and make predictions using the loaded model, as one GEMM on the embeddings
+    scores = embeddings.astype(np.float32) @ W_fused + b_fused
+    predictions_encoded = loaded_log_reg_model.classes_[scores.argmax(axis=1)]
 
     # Inverse transform if using XGBoost (or any model that required label encoding)
     # For Logistic Regression, the loaded_log_reg_model already predicts the original labels
@@ -52,16 +105,23 @@ def predict_new_data(new_descriptions):
 
 print("Inference snippet defined.")
 
-# Example new data
-new_descriptions_example = [
-    "two pay",
-    "Money was debited but the transaction failed.",
-    "Someone used my card for a transaction I didn't make.",
-    "Waiting for a refund after canceling an order."
-]
-
-# Get predictions using the inference snippet
-predictions_example = predict_new_data(new_descriptions_example)
-
-print("\nPredictions for example data:")
-print(predictions_example)
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    if '--export' in sys.argv[1:]:
+        # Explicit build step: export the encoder now rather than on the first prediction
+        export_onnx_encoder()
+        sys.exit()
+
+    # Example new data
+    new_descriptions_example = [
+        "two pay",
+        "Money was debited but the transaction failed.",
+        "Someone used my card for a transaction I didn't make.",
+        "Waiting for a refund after canceling an order."
+    ]
+
+    # Get predictions using the inference snippet
+    predictions_example = predict_new_data(new_descriptions_example)
+
+    print("\nPredictions for example data:")
+    print(predictions_example)
\ No newline at end of file
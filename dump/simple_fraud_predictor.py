@@ -4,64 +4,294 @@ Simple Fraud Category Prediction System
 Direct interface to use your trained logistic regression model
 """
 
-import pickle
-import pandas as pd
+import os
+import csv
+import functools
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
 import re
 import warnings
 warnings.filterwarnings('ignore')
 
 def load_model(model_path='/Users/pranavnair/ml_oasis/Logistic Regression Model.pkl'):
-    """Load the trained logistic regression model"""
+    """
+    Load the trained logistic regression model, with its float32 coefficient arrays
+    memory-mapped from a joblib copy of the pickle (see artifacts.load_artifact)
+    """
+    # joblib (and scikit-learn, via the unpickled model) load here rather than at module import
+    from artifacts import load_artifact
+    
     try:
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
+        model = load_artifact(model_path)
         print("✓ Model loaded successfully")
         return model
     except Exception as e:
         print(f"Error loading model: {e}")
         return None
 
+# Fitted vectorizer and category list, saved by create_vectorizer so later runs skip the CSV
+VECTORIZER_PATH = '/Users/pranavnair/ml_oasis/tfidf.joblib'
+CATEGORIES_PATH = '/Users/pranavnair/ml_oasis/categories.joblib'
+
+def _training_descriptions(f, categories):
+    """Stream the description column of a training CSV, collecting its categories on the way"""
+    for row in csv.DictReader(f):
+        categories.add(row['category'])
+        yield row['description']
+
 def create_vectorizer():
-    """Create and fit a TF-IDF vectorizer on the training data"""
+    """Load the saved TF-IDF vectorizer, or create and fit one on the training data"""
+    import joblib
+    
     try:
-        # Load the training data
+        if os.path.exists(VECTORIZER_PATH) and os.path.exists(CATEGORIES_PATH):
+            vectorizer = joblib.load(VECTORIZER_PATH)
+            categories = joblib.load(CATEGORIES_PATH)
+            print("✓ Vectorizer loaded")
+            return vectorizer, categories
+        
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        # Open the training data (streamed with the csv module; only the descriptions are needed)
         try:
-            df = pd.read_csv('/Users/pranavnair/ml_oasis/fraud_data_cleaned.csv')
+            f = open('/Users/pranavnair/ml_oasis/fraud_data_cleaned.csv', newline='')
         except:
-            df = pd.read_csv('/Users/pranavnair/ml_oasis/fraud_data.csv')
+            f = open('/Users/pranavnair/ml_oasis/fraud_data.csv', newline='')
         
         # Create vectorizer with settings that should match your model
         vectorizer = TfidfVectorizer(
             max_features=177,  # Match the expected input features
             stop_words='english',
             lowercase=True,
-            ngram_range=(1, 1)
+            ngram_range=(1, 1),
+            dtype=np.float32  # half the bytes of the default float64 for every transform
         )
         
         # Fit on training data
-        vectorizer.fit(df['description'])
+        categories = set()
+        with f:
+            vectorizer.fit(_training_descriptions(f, categories))
+        
+        # Get unique categories from data
+        categories = sorted(categories)
+        
+        joblib.dump(vectorizer, VECTORIZER_PATH, compress=3)
+        joblib.dump(categories, CATEGORIES_PATH)
         print("✓ Vectorizer created and fitted")
-        return vectorizer, df
+        return vectorizer, categories
         
     except Exception as e:
         print(f"Error creating vectorizer: {e}")
         return None, None
 
+@functools.lru_cache(maxsize=None)
+def get_onnx_session(model, vectorizer):
+    """
+    Convert the fitted TF-IDF vectorizer + logistic regression into one ONNX graph and
+    open an ONNX Runtime session for it, once per (model, vectorizer) pair.
+    Returns None if the conversion isn't possible, so callers fall back to scikit-learn.
+    """
+    try:
+        import onnxruntime as ort
+        from sklearn.pipeline import Pipeline
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import StringTensorType
+        
+        onnx_model = convert_sklearn(
+            Pipeline([('tfidf', vectorizer), ('lr', model)]),
+            initial_types=[('input', StringTensorType([None]))],
+            target_opset=17,
+            options={id(model): {'zipmap': False}}
+        )
+        # Single-record scoring: one thread avoids pool wake-up overhead on tiny inputs
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = 1
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Opened from the serialized graph in memory, so concurrent workers don't race on a shared .onnx file
+        session = ort.InferenceSession(onnx_model.SerializeToString(), sess_options=session_options,
+                                       providers=['CPUExecutionProvider'])
+        print("✓ ONNX Runtime session created")
+        return session
+    except Exception as e:
+        print(f"Warning: ONNX export failed, using scikit-learn for predictions. Error: {e}")
+        return None
+
+# (model, vectorizer, categories), set by get_pipeline once everything has loaded
+_PIPELINE = None
+
+def get_pipeline():
+    """
+    Load the model and vectorizer once and reuse them on later calls.
+    Returns (model, vectorizer, categories); an entry is None if it failed to load.
+    """
+    global _PIPELINE
+    if _PIPELINE is None:
+        model = load_model()
+        if model is None:
+            return None, None, None
+        vectorizer, categories = create_vectorizer()
+        if vectorizer is None:
+            return model, None, None
+        _PIPELINE = (model, vectorizer, categories)
+    return _PIPELINE
+
+# Text cleanup patterns, compiled once at import
+_WS = re.compile(r'\s+')
+_SPECIAL = re.compile(r'[^\w\s.,!?-]')
+# The ASCII characters _SPECIAL removes, as a bytes.translate delete set (built from _SPECIAL
+# itself so the two can't disagree)
+_SPECIAL_ASCII = bytes(c for c in range(128) if _SPECIAL.match(chr(c)))
+
 def preprocess_text(text):
     """Clean and preprocess the input text"""
     # Convert to lowercase and strip
     text = text.lower().strip()
     
     # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS.sub(' ', text)
     
-    # Remove special characters but keep basic punctuation
-    text = re.sub(r'[^\w\s.,!?-]', '', text)
+    # Remove special characters but keep basic punctuation. ASCII text goes through a C-level
+    # bytes.translate instead of the regex engine; other text needs the regex's Unicode-aware \w.
+    if text.isascii():
+        text = text.encode('ascii').translate(None, _SPECIAL_ASCII).decode('ascii')
+    else:
+        text = _SPECIAL.sub('', text)
     
     return text
 
+@functools.lru_cache(maxsize=None)
+def get_linear_scorer(model, vectorizer):
+    """
+    Pull the TF-IDF vocabulary/idf weights and the logistic regression coefficients out once,
+    so a single description can be scored with a dict lookup per token and one small dot product.
+    Returns None for setups this doesn't reproduce exactly (non-default TF-IDF weighting or a
+    one-vs-rest model), in which case the generic pipeline is used.
+    """
+    multinomial = (getattr(model, 'multi_class', 'auto') in ('auto', 'multinomial', 'deprecated')
+                   and getattr(model, 'solver', 'lbfgs') != 'liblinear'
+                   and len(model.classes_) > 2)
+    if not multinomial or not vectorizer.use_idf or vectorizer.sublinear_tf or vectorizer.norm != 'l2':
+        return None
+    return (vectorizer.build_analyzer(),
+            vectorizer.vocabulary_,
+            vectorizer.idf_.astype(np.float32, copy=False),
+            model.coef_.astype(np.float32, copy=False),
+            model.intercept_.astype(np.float32, copy=False))
+
+@functools.lru_cache(maxsize=None)
+def get_tfidf_logits_kernel():
+    """
+    Compiles (once, on first use) a numba kernel that turns a text's vocabulary indices into
+    LR logits - term counts, idf weighting, L2 normalisation and the dot product - in one
+    compiled loop. Returns None if numba isn't installed.
+    """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    
+    @njit(cache=True)
+    def tfidf_logits(indices, idf, W, b):
+        features = np.zeros(idf.shape[0], dtype=np.float32)
+        for j in indices:
+            features[j] += 1.0
+        norm = 0.0
+        for j in range(features.shape[0]):
+            features[j] *= idf[j]
+            norm += features[j] * features[j]
+        if norm > 0:
+            features /= np.float32(np.sqrt(norm))
+        return W @ features + b
+    
+    return tfidf_logits
+
+def _logits_one(cleaned_text, scorer):
+    """Class logits (the LR decision function) for one cleaned text, from the extracted weights"""
+    analyzer, vocabulary, idf, W, b = scorer
+    
+    # Tokenizing stays in Python (the vectorizer's own analyzer); the numeric part runs compiled
+    kernel = get_tfidf_logits_kernel()
+    if kernel is not None:
+        indices = np.array([j for j in map(vocabulary.get, analyzer(cleaned_text)) if j is not None],
+                           dtype=np.int64)
+        return kernel(indices, idf, W, b)
+    
+    # Term counts -> TF-IDF -> L2 normalise, matching TfidfVectorizer.transform: the vocabulary
+    # indices are counted with one bincount and the idf weighting is applied in place
+    indices = [j for j in map(vocabulary.get, analyzer(cleaned_text)) if j is not None]
+    features = np.bincount(indices, minlength=len(idf)).astype(np.float32)
+    np.multiply(features, idf, out=features)
+    norm = np.linalg.norm(features)
+    if norm > 0:
+        features /= norm
+    
+    return W @ features + b
+
+def _score_one(cleaned_text, scorer, model):
+    """Score one cleaned text with the extracted weights; returns (prediction, probabilities)"""
+    # Softmax over the class logits, matching LogisticRegression.predict_proba. It runs in place
+    # on the freshly computed logits buffer, with no temporaries; the argmax is the logits' argmax.
+    logits = _logits_one(cleaned_text, scorer)
+    top = logits.argmax()
+    logits -= logits[top]
+    probabilities = np.exp(logits, out=logits)
+    probabilities /= probabilities.sum()
+    return model.classes_[top], probabilities
+
+def _score(cleaned_texts, model, vectorizer):
+    """Vectorize and score cleaned texts; returns (predictions, probabilities) with one row per text"""
+    # Vectorize and score in one ONNX Runtime call, or through scikit-learn if the
+    # pipeline couldn't be exported
+    session = get_onnx_session(model, vectorizer)
+    if session is not None:
+        predictions, probabilities = session.run(None, {'input': np.asarray(cleaned_texts, dtype=object)})
+    else:
+        text_vectors = vectorizer.transform(cleaned_texts)
+        probabilities = model.predict_proba(text_vectors)
+        predictions = model.classes_[probabilities.argmax(axis=1)]
+    return predictions, probabilities
+
+# Category names used when the caller doesn't pass any
+DEFAULT_CATEGORIES = ['DUPLICATE_CHARGE', 'FAILED_TRANSACTION', 'FRAUD', 'REFUND_PENDING', 'OTHERS']
+
+def _category_name(prediction, categories):
+    """Map a model class label to its category name"""
+    if isinstance(prediction, (int, np.integer)):
+        return categories[prediction] if prediction < len(categories) else f"Category_{prediction}"
+    return str(prediction)
+
+@functools.lru_cache(maxsize=None)
+def _label_map(model, categories):
+    """
+    Category name for each of the model's class labels, built once per (model, categories)
+    so predictions are translated with a single dict lookup
+    """
+    return {label: _category_name(label, categories) for label in model.classes_}
+
+def get_label_map(model, categories=None):
+    """Return the class label -> category name map for a model and category list"""
+    return _label_map(model, tuple(DEFAULT_CATEGORIES if categories is None else categories))
+
+def _format_result(description, cleaned_text, predicted_category, probabilities, categories):
+    """Build the prediction result dictionary for one description"""
+    # Get category names
+    if categories is None:
+        categories = DEFAULT_CATEGORIES
+    
+    # Create confidence scores, sorted by confidence in one argsort (stable, so ties keep the
+    # category order)
+    percentages = np.round(np.asarray(probabilities) * 100, 2)
+    scored = percentages[:len(categories)]
+    order = np.argsort(-scored, kind='stable')
+    sorted_scores = {categories[i]: scored[i] for i in order}
+    
+    return {
+        'original_text': description,
+        'cleaned_text': cleaned_text,
+        'predicted_category': predicted_category,
+        'confidence': percentages.max(),
+        'all_probabilities': sorted_scores
+    }
+
 def predict_fraud_category(description, model=None, vectorizer=None, categories=None):
     """
     Predict fraud category for a given description
@@ -82,41 +312,103 @@ def predict_fraud_category(description, model=None, vectorizer=None, categories=
         # Preprocess the text
         cleaned_text = preprocess_text(description)
         
-        # Vectorize the text
-        text_vector = vectorizer.transform([cleaned_text])
-        
-        # Make prediction
-        prediction = model.predict(text_vector)[0]
-        probabilities = model.predict_proba(text_vector)[0]
-        
-        # Get category names
-        if categories is None:
-            categories = ['DUPLICATE_CHARGE', 'FAILED_TRANSACTION', 'FRAUD', 'REFUND_PENDING', 'OTHERS']
+        # For one record a hand-rolled TF-IDF + dot product beats building a sparse matrix
+        scorer = get_linear_scorer(model, vectorizer)
+        if scorer is not None:
+            prediction, probabilities = _score_one(cleaned_text, scorer, model)
+        else:
+            predictions, probabilities = _score([cleaned_text], model, vectorizer)
+            prediction, probabilities = predictions[0], probabilities[0]
         
         # Map prediction to category
-        if isinstance(prediction, (int, np.integer)):
-            predicted_category = categories[prediction] if prediction < len(categories) else f"Category_{prediction}"
-        else:
-            predicted_category = str(prediction)
+        predicted_category = get_label_map(model, categories)[prediction]
         
-        # Create confidence scores
-        confidence_scores = {}
-        for i, category in enumerate(categories[:len(probabilities)]):
-            confidence_scores[category] = round(probabilities[i] * 100, 2)
+        return _format_result(description, cleaned_text, predicted_category, probabilities, categories)
         
-        # Sort by confidence
-        sorted_scores = dict(sorted(confidence_scores.items(), key=lambda x: x[1], reverse=True))
+    except Exception as e:
+        return {"error": f"Prediction failed: {e}"}
+
+def classify_only(description, model=None, vectorizer=None, categories=None):
+    """
+    Predict just the fraud category for a description, as the argmax of the decision
+    function, skipping the softmax and per-category scores of predict_fraud_category
+    
+    Args:
+        description (str): The fraud description text
+        model: Trained logistic regression model
+        vectorizer: Fitted TF-IDF vectorizer
+        categories (list): List of category names
+    
+    Returns:
+        str: Predicted category, or None if prediction failed
+    """
+    if model is None or vectorizer is None:
+        return None
+    
+    try:
+        cleaned_text = preprocess_text(description)
+        label_map = get_label_map(model, categories)
+        scorer = get_linear_scorer(model, vectorizer)
+        if scorer is not None:
+            return label_map[model.classes_[np.argmax(_logits_one(cleaned_text, scorer))]]
+        # model.predict is exactly the argmax of decision_function (binary models included)
+        return label_map[model.predict(vectorizer.transform([cleaned_text]))[0]]
+    except Exception as e:
+        print(f"Error: Prediction failed: {e}")
+        return None
+
+def predict_fraud_category_batch(descriptions, model=None, vectorizer=None, categories=None):
+    """
+    Predict fraud categories for many descriptions, cleaning, vectorizing and scoring
+    them all at once instead of one at a time
+    
+    Args:
+        descriptions (list): The fraud description texts
+        model: Trained logistic regression model
+        vectorizer: Fitted TF-IDF vectorizer
+        categories (list): List of category names
+    
+    Returns:
+        list: Prediction results, one dict per description
+    """
+    if model is None or vectorizer is None:
+        return [{"error": "Model or vectorizer not provided"}] * len(descriptions)
+    
+    try:
+        # Preprocess the texts
+        cleaned_texts = [preprocess_text(description) for description in descriptions]
         
-        return {
-            'original_text': description,
-            'cleaned_text': cleaned_text,
-            'predicted_category': predicted_category,
-            'confidence': round(max(probabilities) * 100, 2),
-            'all_probabilities': sorted_scores
-        }
+        predictions, probabilities = _score(cleaned_texts, model, vectorizer)
+        label_map = get_label_map(model, categories)
+        
+        return [_format_result(description, cleaned_text, label_map[prediction], row, categories)
+                for description, cleaned_text, prediction, row
+                in zip(descriptions, cleaned_texts, predictions, probabilities)]
         
     except Exception as e:
-        return {"error": f"Prediction failed: {e}"}
+        return [{"error": f"Prediction failed: {e}"}] * len(descriptions)
+
+def preload():
+    """
+    Load the pipeline and build everything the single-record path caches on first use (label
+    map, extracted weights, compiled numba kernel). Call it in a parent process before forking
+    workers: they inherit it all copy-on-write, and the memory-mapped model weights are already
+    shared through the page cache, so no worker repeats the loading or compiling.
+    Returns (model, vectorizer, categories), like get_pipeline.
+    """
+    model, vectorizer, categories = get_pipeline()
+    if model is None or vectorizer is None:
+        return model, vectorizer, categories
+    get_label_map(model, categories)
+    scorer = get_linear_scorer(model, vectorizer)
+    if scorer is not None:
+        # numba compiles on the first call, so score an empty text once
+        _logits_one('', scorer)
+    # The ONNX Runtime session is left to each process: its thread pool doesn't survive a fork
+    return model, vectorizer, categories
+
+# Longest probability bar (100% at one block per 5%); shorter bars are slices of it
+_FULL_BAR = "█" * 20
 
 def interactive_mode():
     """Run interactive prediction mode"""
@@ -125,18 +417,15 @@ def interactive_mode():
     print("="*60)
     
     # Load model and setup
-    model = load_model()
+    model, vectorizer, categories = preload()
     if model is None:
         print("Failed to load model. Exiting.")
         return
     
-    vectorizer, df = create_vectorizer()
     if vectorizer is None:
         print("Failed to create vectorizer. Exiting.")
         return
     
-    # Get unique categories from data
-    categories = sorted(df['category'].unique().tolist())
     print(f"Available categories: {', '.join(categories)}")
     
     print("\nEnter fraud descriptions to get predictions.")
@@ -173,8 +462,8 @@ def interactive_mode():
                 print(f"\n{'='*50}")
                 print("RUNNING TEST PREDICTIONS:")
                 print(f"{'='*50}")
-                for i, test_desc in enumerate(test_cases, 1):
-                    result = predict_fraud_category(test_desc, model, vectorizer, categories)
+                results = predict_fraud_category_batch(test_cases, model, vectorizer, categories)
+                for i, (test_desc, result) in enumerate(zip(test_cases, results), 1):
                     if 'error' not in result:
                         print(f"\n{i}. Input: {test_desc}")
                         print(f"   Prediction: {result['predicted_category']} ({result['confidence']}%)")
@@ -202,7 +491,7 @@ def interactive_mode():
             print(f"📊 Confidence: {result['confidence']}%")
             print(f"\n📈 All Probabilities:")
             for category, prob in result['all_probabilities'].items():
-                bar = "█" * max(1, int(prob / 5))  # Visual bar
+                bar = _FULL_BAR[:max(1, int(prob / 5))]  # Visual bar
                 print(f"   {category:<18}: {prob:>6.2f}% {bar}")
             print(f"{'='*50}")
             
@@ -222,16 +511,13 @@ def predict_single_description(description):
     Returns:
         dict: Prediction result
     """
-    model = load_model()
+    model, vectorizer, categories = get_pipeline()
     if model is None:
         return {"error": "Failed to load model"}
     
-    vectorizer, df = create_vectorizer()
     if vectorizer is None:
         return {"error": "Failed to create vectorizer"}
     
-    categories = sorted(df['category'].unique().tolist())
-    
     return predict_fraud_category(description, model, vectorizer, categories)
 
 if __name__ == "__main__":